@@ -1,13 +1,15 @@
 """
 Search KeePassXC password databases, perform autotype, and copy passwords.
 """
+import atexit
 import logging
 import os
 import sys
 import time
 import subprocess
-from threading import Thread
-from typing import Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, FrozenSet
 import gi
 from ulauncher.api.client.Extension import Extension
 from ulauncher.api.client.EventListener import EventListener
@@ -27,7 +29,11 @@ from .keepassxc_db import (
     KeepassxcCliError,
 )
 from .gtk_passphrase_entry import GtkPassphraseEntryWindow
-from .wmctrl import activate_window_by_class_name, WmctrlNotFoundError
+from .wmctrl import (
+    activate_window_by_class_name,
+    WmctrlNotFoundError,
+    WmctrlWindowNotFoundError,
+)
 from . import render
 
 gi.require_version("Notify", "0.7")
@@ -37,28 +43,63 @@ from gi.repository import Notify  # noqa: E402
 
 logger = logging.getLogger(__name__)
 
+# Background work (autotype, window activation) shares a few long-lived threads
+_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="kpxc")
+atexit.register(_EXECUTOR.shutdown, wait=False)
+
 
 def activate_passphrase_window() -> None:
     """
     Attempts to activate the passphrase window.
-    Uses polling (loop) instead of a fixed sleep to handle race conditions better.
+    The window presents itself once mapped, this is a fallback for window
+    managers that ignore that. Polls until the window shows up.
     """
     max_retries = 20
     for _ in range(max_retries):
         try:
             activate_window_by_class_name("main.py.KeePassXC Search")
-            # If successful, we could break, but sometimes it takes a split second more to fully focus
+            return
+        except WmctrlWindowNotFoundError:
+            pass  # Window not found yet
         except WmctrlNotFoundError:
             logger.warning(
                 "wmctrl not installed, unable to activate passphrase entry window"
             )
             return
-        except Exception:
-            pass # Window not found yet
-        
+        except Exception as e:
+            logger.warning(f"Unable to activate passphrase entry window: {e}")
+            return
+
         time.sleep(0.1)
 
 
+def _wait_ulauncher_gone(max_ms: int = 500) -> None:
+    """
+    Waits until focus has left the Ulauncher window, so that the keystrokes
+    go to the previously focused window. Ulauncher hides itself before the
+    event arrives, but focus moves back a little later.
+    Gives up after `max_ms`.
+    """
+    deadline = time.monotonic() + max_ms / 1000
+    while time.monotonic() < deadline:
+        try:
+            # getwindowname works with every xdotool release, unlike
+            # getwindowclassname (3.2021+). Ulauncher's title starts with
+            # "Ulauncher".
+            proc = subprocess.run(
+                ["xdotool", "getactivewindow", "getwindowname"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                check=False,
+            )
+        except OSError:
+            return  # No xdotool, typing will fail anyway
+        # Non-zero exit: nothing has focus, so Ulauncher doesn't either
+        if proc.returncode != 0 or not proc.stdout.startswith(b"Ulauncher"):
+            return
+        time.sleep(0.01)
+
+
 def perform_type_text(text: str) -> None:
     """
     Simulates keystrokes using xdotool.
@@ -68,7 +109,7 @@ def perform_type_text(text: str) -> None:
     - Uses STDIN pipe to xdotool to avoid leaking credentials in process list (ps aux).
     - Clears modifiers to avoid stuck keys (like Shift or Alt).
     """
-    time.sleep(0.5) # Wait for Ulauncher window to disappear
+    _wait_ulauncher_gone()
 
     if not text:
         return
@@ -84,6 +125,25 @@ def perform_type_text(text: str) -> None:
         logger.error(f"Typing failed: {e}")
 
 
+def notify(message: str) -> None:
+    """
+    Shows a desktop notification without blocking the caller on D-Bus.
+    """
+    _EXECUTOR.submit(lambda: Notify.Notification.new(message).show())
+
+
+def parse_entry_fields(value: Optional[str]) -> FrozenSet[str]:
+    """
+    Parses the comma separated "entry-fields" preference. Field names are
+    matched case insensitively, unknown names are ignored. An empty value
+    enables every field.
+    """
+    by_lower = {field.lower(): field for field in render.ENTRY_FIELDS}
+    names = (name.strip().lower() for name in (value or "").split(","))
+    fields = frozenset(by_lower[name] for name in names if name in by_lower)
+    return fields or render.ENTRY_FIELDS
+
+
 def current_script_path() -> str:
     return os.path.abspath(os.path.dirname(sys.argv[0]))
 
@@ -91,6 +151,9 @@ def current_script_path() -> str:
 class KeepassxcExtension(Extension):
     """ Extension class, coordinates everything """
 
+    # "No search to restore" marker, avoids a None check on every keystroke
+    NO_SEARCH_RESTORE = (None, None)
+
     def __init__(self):
         super(KeepassxcExtension, self).__init__()
         self.keepassxc_db = KeepassxcDatabase()
@@ -100,17 +163,38 @@ class KeepassxcExtension(Extension):
             PreferencesUpdateEvent, PreferencesUpdateEventListener(self.keepassxc_db)
         )
         self.active_entry = None
-        self.active_entry_search_restore = None
-        self.recent_active_entries = []
+        self.active_entry_search_restore = self.NO_SEARCH_RESTORE
+        # Used as an ordered set, most recently activated entry first
+        self.recent_active_entries: "OrderedDict[str, None]" = OrderedDict()
+        # Parsed preference values, reset by PreferencesUpdateEventListener
+        self._db_path: Optional[str] = None
+        self._max_result_items: Optional[int] = None
+        self._inactivity_lock_timeout: Optional[int] = None
+        self._enabled_fields: Optional[FrozenSet[str]] = None
 
     def get_db_path(self) -> str:
-        return os.path.expanduser(self.preferences["database-path"])
+        if self._db_path is None:
+            self._db_path = os.path.expanduser(self.preferences["database-path"])
+        return self._db_path
 
     def get_max_result_items(self) -> int:
-        return int(self.preferences["max-results"])
+        if self._max_result_items is None:
+            self._max_result_items = int(self.preferences["max-results"])
+        return self._max_result_items
 
     def get_inactivity_lock_timeout(self) -> int:
-        return int(self.preferences["inactivity-lock-timeout"])
+        if self._inactivity_lock_timeout is None:
+            self._inactivity_lock_timeout = int(
+                self.preferences["inactivity-lock-timeout"]
+            )
+        return self._inactivity_lock_timeout
+
+    def get_enabled_fields(self) -> FrozenSet[str]:
+        if self._enabled_fields is None:
+            self._enabled_fields = parse_entry_fields(
+                self.preferences.get("entry-fields")
+            )
+        return self._enabled_fields
 
     # ... (Helper methods for state management remain unchanged) ...
     def set_active_entry(self, keyword: str, entry: str) -> None:
@@ -125,25 +209,37 @@ class KeepassxcExtension(Extension):
         self.active_entry_search_restore = (entry, query_arg)
 
     def check_and_reset_search_restore(self, query_arg: str) -> Optional[str]:
-        if self.active_entry_search_restore:
-            (prev_active_entry, prev_query_arg) = self.active_entry_search_restore
-            self.active_entry_search_restore = None
-            some_chars_erased = prev_active_entry.startswith(query_arg)
-            return prev_query_arg if some_chars_erased else None
-        return None
+        (prev_active_entry, prev_query_arg) = self.active_entry_search_restore
+        if prev_active_entry is None:
+            return None
+        self.active_entry_search_restore = self.NO_SEARCH_RESTORE
+        some_chars_erased = prev_active_entry.startswith(query_arg)
+        return prev_query_arg if some_chars_erased else None
 
     def add_recent_active_entry(self, entry: str) -> None:
-        if entry in self.recent_active_entries:
-            idx = self.recent_active_entries.index(entry)
-            del self.recent_active_entries[idx]
-        self.recent_active_entries = [entry] + self.recent_active_entries
+        self.recent_active_entries[entry] = None
+        self.recent_active_entries.move_to_end(entry, last=False)
+        max_items = self.get_max_result_items()
+        while len(self.recent_active_entries) > max_items:
+            self.recent_active_entries.popitem()
+
+    def max_result_items_changed(self) -> None:
+        self._max_result_items = None
         max_items = self.get_max_result_items()
-        self.recent_active_entries = self.recent_active_entries[:max_items]
+        while len(self.recent_active_entries) > max_items:
+            self.recent_active_entries.popitem()
+
+    def inactivity_lock_timeout_changed(self) -> None:
+        self._inactivity_lock_timeout = None
+
+    def enabled_fields_changed(self) -> None:
+        self._enabled_fields = None
 
     def database_path_changed(self) -> None:
-        self.recent_active_entries = []
+        self._db_path = None
+        self.recent_active_entries.clear()
         self.active_entry = None
-        self.active_entry_search_restore = None
+        self.active_entry_search_restore = self.NO_SEARCH_RESTORE
 
 
 class KeywordQueryEventListener(EventListener):
@@ -177,7 +273,7 @@ class KeywordQueryEventListener(EventListener):
                 return render.search_results(
                     query_keyword,
                     "",
-                    extension.recent_active_entries,
+                    list(extension.recent_active_entries),
                     extension.get_max_result_items(),
                 )
             return render.ask_to_enter_query()
@@ -187,7 +283,9 @@ class KeywordQueryEventListener(EventListener):
             try:
                 details = self.keepassxc_db.get_entry_details(query_arg)
                 # FIX: Pass query_arg (entry name) AND details to render
-                return render.active_entry(query_arg, details)
+                return render.active_entry(
+                    query_arg, details, extension.get_enabled_fields()
+                )
             except Exception:
                  return render.keepassxc_cli_error("Could not fetch details")
 
@@ -218,20 +316,19 @@ class ItemEnterEventListener(EventListener):
                 field_key = data.get("field") # 'Password', 'UserName', 'URL', 'TOTP'
                 
                 try:
-                    # Fetch fresh details to be safe
-                    details = self.keepassxc_db.get_entry_details(entry)
-                    val = details.get(field_key, "")
+                    # Usually cached from the details view, TOTP is always fresh
+                    val = self.keepassxc_db.get_entry_attribute(entry, field_key)
                     
                     if val:
                         # Run in background to not block Ulauncher
-                        Thread(target=perform_type_text, args=(val,)).start()
+                        _EXECUTOR.submit(perform_type_text, val)
                         return DoNothingAction()
                     else:
-                        Notify.Notification.new(f"Field {field_key} is empty").show()
+                        notify(f"Field {field_key} is empty")
                         return DoNothingAction()
 
                 except Exception as e:
-                    Notify.Notification.new(f"Autotype failed: {e}").show()
+                    notify(f"Autotype failed: {e}")
                     return DoNothingAction()
 
             # --- ACTION: Secure Clipboard Copy ---
@@ -240,7 +337,7 @@ class ItemEnterEventListener(EventListener):
                 attr = data.get("attr", "password")
                 # Trigger the secure copy (keepassxc-cli clip)
                 self.keepassxc_db.copy_to_clipboard(entry, attr, timeout=20)
-                Notify.Notification.new(f"{attr.capitalize()} copied. Clears in 20s.").show()
+                notify(f"{attr.capitalize()} copied. Clears in 20s.")
                 return DoNothingAction()
 
             # --- ACTION: Read Passphrase ---
@@ -260,7 +357,7 @@ class ItemEnterEventListener(EventListener):
 
             # --- ACTION: Simple Notification ---
             if action == "show_notification":
-                Notify.Notification.new(data.get("summary")).show()
+                notify(data.get("summary"))
 
         except KeepassxcCliNotFoundError:
             return render.cli_not_found_error()
@@ -277,15 +374,16 @@ class ItemEnterEventListener(EventListener):
         """
         win = GtkPassphraseEntryWindow(
             verify_passphrase_fn=self.keepassxc_db.verify_and_set_passphrase,
+            discard_passphrase_fn=self.keepassxc_db.lock,
             icon_file=os.path.join(
                 current_script_path(), "images/keepassxc-search.svg"
             ),
         )
-        Thread(target=activate_passphrase_window).start()
+        _EXECUTOR.submit(activate_passphrase_window)
 
         win.read_passphrase()
         if not self.keepassxc_db.is_passphrase_needed():
-            Notify.Notification.new("KeePassXC database unlocked.").show()
+            notify("KeePassXC database unlocked.")
 
 
 class PreferencesUpdateEventListener(EventListener):
@@ -299,4 +397,9 @@ class PreferencesUpdateEventListener(EventListener):
                 self.keepassxc_db.change_path(event.new_value)
                 extension.database_path_changed()
             elif event.id == "inactivity-lock-timeout":
-                self.keepassxc_db.change_inactivity_lock_timeout(int(event.new_value))
\ No newline at end of file
+                self.keepassxc_db.change_inactivity_lock_timeout(int(event.new_value))
+                extension.inactivity_lock_timeout_changed()
+            elif event.id == "max-results":
+                extension.max_result_items_changed()
+            elif event.id == "entry-fields":
+                extension.enabled_fields_changed()
@@ -2,20 +2,35 @@
 GTK Window for entering the KeepassXC passphrase.
 Includes fixes for UI freezing and double-submission issues.
 """
+import logging
+from threading import Thread
 import gi
 gi.require_version("Gtk", "3.0")
 # pylint: disable=wrong-import-position
-from gi.repository import Gtk, GdkPixbuf
+from gi.repository import Gtk, GdkPixbuf, GLib
+
+logger = logging.getLogger(__name__)
+
+VERIFYING_MARKUP = "Verifying passphrase..."
+INCORRECT_MARKUP = (
+    '<span foreground="red">Incorrect passphrase, please try again:</span>'
+)
 
 class GtkPassphraseEntryWindow(Gtk.Window):
     """
     A modal window that asks the user for a password.
     """
 
-    def __init__(self, verify_passphrase_fn=None, icon_file=None):
+    def __init__(
+        self, verify_passphrase_fn=None, discard_passphrase_fn=None, icon_file=None
+    ):
         super(GtkPassphraseEntryWindow, self).__init__(title="Enter passphrase")
         self.verify_passphrase_fn = verify_passphrase_fn
+        # Undoes a successful verification the user no longer wants
+        self.discard_passphrase_fn = discard_passphrase_fn
         self.passphrase = None
+        self.closed = False
+        self.verifying = False
 
         self.set_position(Gtk.WindowPosition.CENTER)
         self.set_border_width(10)
@@ -36,16 +51,35 @@ class GtkPassphraseEntryWindow(Gtk.Window):
         self.entry.connect("activate", self.enter_pressed)
         vbox.pack_start(self.entry, True, True, 0)
 
-        self.connect("destroy", Gtk.main_quit)
+        self.connect("destroy", self.on_destroy)
+        self.connect("map-event", self.on_mapped)
         self.show_all()
 
     def read_passphrase(self):
         """
         Starts the GTK main loop and blocks until the window is closed.
+        Returns the passphrase only if there was no verification function.
         """
         Gtk.main()
         return self.passphrase
 
+    def on_mapped(self, widget, event) -> bool:
+        """
+        Grab focus as soon as the window is on screen.
+        """
+        self.present_with_time(Gtk.get_current_event_time())
+        return False
+
+    def on_destroy(self, widget) -> None:
+        """
+        Ends the main loop, unless a verification still has to report back.
+        Then verification_done() ends it, so the result can't leak into a
+        later window's main loop.
+        """
+        self.closed = True
+        if not self.verifying:
+            Gtk.main_quit()
+
     def enter_pressed(self, entry: Gtk.Entry) -> None:
         """
         Handle the Enter key event.
@@ -63,39 +97,66 @@ class GtkPassphraseEntryWindow(Gtk.Window):
         if self.verify_passphrase_fn:
             # Update UI to show we are verifying
             self.show_verifying_passphrase()
-            
-            # This is the blocking call to keepassxc-cli
-            if self.verify_passphrase_fn(passphrase):
-                self.passphrase = passphrase
-                self.close_window()
-            else:
-                # IMPORTANT: If verification fails, re-enable the input!
-                self.entry.set_sensitive(True) 
-                self.entry.grab_focus()
-                self.show_incorrect_passphrase()
+
+            # keepassxc-cli takes a while to unlock, keep the GTK loop running
+            self.verifying = True
+            Thread(
+                target=self.verify_in_background, args=(passphrase,), daemon=True
+            ).start()
         else:
             # No verification function provided (should not happen in this ext)
             self.passphrase = passphrase
             self.close_window()
 
+    def verify_in_background(self, passphrase: str) -> None:
+        """
+        Runs the blocking verification off the GTK thread,
+        then hands the result back to it.
+        """
+        is_valid = False
+        try:
+            # Closed before we even started, don't store the passphrase at all
+            is_valid = not self.closed and self.verify_passphrase_fn(passphrase)
+        except Exception as e:
+            logger.error(f"Passphrase verification failed: {e}")
+            # It may have been stored before things went wrong
+            if self.discard_passphrase_fn:
+                self.discard_passphrase_fn()
+        finally:
+            # Always report back, on_destroy relies on it to end the main loop
+            GLib.idle_add(self.verification_done, is_valid)
+
+    def verification_done(self, is_valid: bool) -> bool:
+        """
+        Called on the GTK thread once the passphrase has been verified.
+        The verified passphrase is not kept here, the database holds it.
+        """
+        self.verifying = False
+        if self.closed:
+            # The user closed the window while waiting, don't unlock after all
+            if is_valid and self.discard_passphrase_fn:
+                self.discard_passphrase_fn()
+            Gtk.main_quit()
+        elif is_valid:
+            self.close_window()
+        else:
+            # IMPORTANT: If verification fails, re-enable the input!
+            self.entry.set_sensitive(True)
+            self.entry.grab_focus()
+            self.show_incorrect_passphrase()
+        return False  # Run only once
+
     def show_verifying_passphrase(self) -> None:
         """
-        Updates label and forces a UI redraw to prevent "frozen" look.
+        Updates label to show that verification is in progress.
         """
-        self.label.set_markup("Verifying passphrase...")
-        
-        # Force GTK to process pending events (like redrawing the label)
-        # BEFORE we block the thread with the CLI call.
-        while Gtk.events_pending():
-            Gtk.main_iteration()
+        self.label.set_markup(VERIFYING_MARKUP)
 
     def show_incorrect_passphrase(self) -> None:
         """
         Updates label to show error state.
         """
-        self.label.set_markup(
-            '<span foreground="red">Incorrect passphrase, please try again:</span>'
-        )
+        self.label.set_markup(INCORRECT_MARKUP)
 
     def close_window(self) -> None:
         self.destroy()
\ No newline at end of file
@@ -2,10 +2,39 @@
 Wrapper around the KeePassXC CLI.
 Handles database interaction, locking logic, and secure clipboard operations.
 """
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+from collections import OrderedDict
+import ctypes
+import mmap
 import subprocess
 import os
-from threading import Timer
+import shutil
+import time
+from stat import S_ISREG
+from threading import Lock, RLock, Timer
+
+# Attributes fetched by `get_entry_details`, multi-line Notes must stay last
+ENTRY_ATTRIBUTES = ("UserName", "Password", "URL", "Notes")
+
+# Printed by `keepassxc-cli search` on stderr when nothing matched
+_NO_RESULTS_NEEDLE = b"No results for that"
+
+_LIBC = ctypes.CDLL(None, use_errno=True)
+_LIBC.mlock.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+
+
+def _mlock(buf: mmap.mmap) -> bool:
+    """
+    Locks the pages of `buf` in RAM so they never get written to swap.
+    Best effort: fails e.g. when RLIMIT_MEMLOCK is exhausted.
+    Unmapping the buffer unlocks it again.
+    """
+    ptr = ctypes.c_char.from_buffer(buf)
+    try:
+        return _LIBC.mlock(ctypes.addressof(ptr), len(buf)) == 0
+    finally:
+        del ptr
+
 
 class KeepassxcCliNotFoundError(Exception):
     """ Unable to execute KeePassXC CLI """
@@ -20,6 +49,8 @@ class KeepassxcCliError(Exception):
     """ Contains error message returned by keepassxc-cli """
     def __init__(self, message):
         super(KeepassxcCliError, self).__init__()
+        if isinstance(message, bytes):
+            message = message.decode("utf-8", "replace")
         self.message = message
 
 class KeepassxcDatabase:
@@ -30,9 +61,35 @@ class KeepassxcDatabase:
         self.cli_checked = False
         self.path = None
         self.path_checked = False
-        self.passphrase = None
+        # (mtime, size) of the database file the cached results came from
+        self._db_signature: Optional[Tuple[int, int]] = None
+        # The passphrase lives in an anonymous in-memory file (memfd)
+        self._passphrase_fd: Optional[int] = None
+        self._passphrase_map: Optional[mmap.mmap] = None
+        # Guards the two above, the lock timer wipes them from its own thread
+        self._passphrase_lock = Lock()
         self.inactivity_lock_timeout = 0
         self.lock_timer = None
+        # Monotonic time after which the passphrase gets wiped
+        self._lock_deadline = float("inf")
+        # Short-lived memo of `show` results: entry -> (fetched_at, details)
+        self._details_cache: "OrderedDict[str, Tuple[float, Dict[str, str]]]" = (
+            OrderedDict()
+        )
+        self._details_ttl = 15
+        self._details_maxsize = 64
+        # Memo of `search` results: query -> (fetched_at, entries)
+        self._search_cache: "OrderedDict[str, Tuple[float, List[str]]]" = (
+            OrderedDict()
+        )
+        self._search_ttl = 30
+        self._search_maxsize = 32
+        # Guards the caches, the lock timer clears them from its own thread
+        self._cache_lock = RLock()
+        # Running `clip` processes, kept so they can be reaped
+        self._clip_procs: List[subprocess.Popen] = []
+        # Whether an entry has TOTP set up, so `show -t` isn't tried in vain
+        self._has_totp: Dict[str, bool] = {}
 
     def initialize(self, path: str, inactivity_lock_timeout: int) -> None:
         """
@@ -52,36 +109,94 @@ class KeepassxcDatabase:
         if path != self.path:
             self.path = path
             self.path_checked = False
-            self.passphrase = None
             self._wipe_passphrase()
 
-        # Validate file existence
-        if not self.path_checked:
-            if os.path.exists(self.path):
-                self.path_checked = True
-            else:
+        # A single stat() validates the file and tells whether cached results
+        # are stale because the database was saved by someone else
+        # (e.g. KeePassXC itself). Much cheaper than asking the CLI.
+        stat: Optional[os.stat_result]
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            stat = None
+        if stat is None or not S_ISREG(stat.st_mode):
+            if not self.path_checked:
                 raise KeepassxcFileNotFoundError()
+            # Gone since (deleted, moved, unmounted), nothing cached is valid.
+            # Let the CLI report the problem.
+            self._db_signature = None
+            self._clear_caches()
+            return
+        self.path_checked = True
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._db_signature:
+            self._db_signature = signature
+            self._clear_caches()
 
     def _wipe_passphrase(self):
         """ 
         Security Feature: Actively wipes the passphrase from memory.
         This is called by the inactivity timer.
         """
-        self.passphrase = None
+        with self._passphrase_lock:
+            self._discard_passphrase()
+        if self.lock_timer:
+            self.lock_timer.cancel()
         self.lock_timer = None
+        self._lock_deadline = float("inf")
+        self._clear_caches()
+
+    def _discard_passphrase(self) -> None:
+        """ Zeroes and releases the memfd. Caller must hold _passphrase_lock. """
+        if self._passphrase_map is not None:
+            self._passphrase_map[:] = bytes(len(self._passphrase_map))
+            self._passphrase_map.close()
+            self._passphrase_map = None
+        if self._passphrase_fd is not None:
+            # Truncating frees the pages holding the plaintext
+            os.ftruncate(self._passphrase_fd, 0)
+            os.close(self._passphrase_fd)
+            self._passphrase_fd = None
+
+    def _clear_caches(self):
+        """
+        Drops all memoized CLI results.
+        Called whenever the database gets locked or switched.
+        """
+        with self._cache_lock:
+            self._details_cache.clear()
+            self._search_cache.clear()
+            self._has_totp.clear()
 
     def _reset_lock_timer(self):
         """ 
-        Resets the self-destruct timer for the passphrase.
+        Pushes the self-destruct deadline for the passphrase forward.
         Called after every successful user interaction.
+        This only moves a timestamp, there is at most one timer thread which
+        checks the deadline when it fires and re-arms itself if it moved.
         """
-        if self.lock_timer:
-            self.lock_timer.cancel()
-        
-        if self.inactivity_lock_timeout > 0:
-            # Start a background timer to wipe memory after X seconds
-            self.lock_timer = Timer(self.inactivity_lock_timeout, self._wipe_passphrase)
-            self.lock_timer.start()
+        if self.inactivity_lock_timeout <= 0:
+            self._lock_deadline = float("inf")
+            return
+
+        self._lock_deadline = time.monotonic() + self.inactivity_lock_timeout
+        if not (self.lock_timer and self.lock_timer.is_alive()):
+            self._start_lock_timer(self.inactivity_lock_timeout)
+
+    def _start_lock_timer(self, secs: float) -> None:
+        # Start a background timer to wipe memory after X seconds
+        self.lock_timer = Timer(secs, self._on_lock_timer)
+        self.lock_timer.daemon = True
+        self.lock_timer.start()
+
+    def _on_lock_timer(self) -> None:
+        remaining = self._lock_deadline - time.monotonic()
+        if remaining > 0:
+            # There was activity since the timer was started
+            self._start_lock_timer(remaining)
+        else:
+            self._wipe_passphrase()
 
     def change_path(self, new_path: str) -> None:
         self.path = os.path.expanduser(new_path)
@@ -93,21 +208,62 @@ class KeepassxcDatabase:
         # Security: Lock immediately when changing security settings
         self._wipe_passphrase()
 
+    def lock(self) -> None:
+        """ Forgets the passphrase, e.g. when the user cancelled unlocking """
+        self._wipe_passphrase()
+
     def is_passphrase_needed(self):
-        return self.passphrase is None
+        # The timer thread may not have caught up yet, so check here as well
+        if self._passphrase_fd is not None and time.monotonic() >= self._lock_deadline:
+            self._wipe_passphrase()
+        return self._passphrase_fd is None
+
+    def _store_passphrase(self, passphrase: str) -> None:
+        """
+        Keeps the passphrase in a memfd that keepassxc-cli reads as its stdin.
+        It gets encoded once here instead of copied into a buffer on every call.
+        """
+        self._wipe_passphrase()
+        # Encode into a mutable buffer so the copy can be zeroed right away
+        secret = bytearray(passphrase, "utf-8")
+        try:
+            with self._passphrase_lock:
+                self._discard_passphrase()
+                fd = os.memfd_create("keepassxc-passphrase", os.MFD_CLOEXEC)
+                self._passphrase_fd = fd
+                if secret:
+                    # Write through a locked mapping, so it never hits swap
+                    os.ftruncate(fd, len(secret))
+                    self._passphrase_map = mmap.mmap(fd, len(secret))
+                    _mlock(self._passphrase_map)
+                    self._passphrase_map[:] = secret
+        finally:
+            secret[:] = bytes(len(secret))
+
+    def _open_passphrase(self) -> Optional[int]:
+        """
+        Opens the stored passphrase for reading from the start.
+        Every reader gets its own file offset, so concurrent calls don't clash.
+        Returns None if there is no passphrase (anymore).
+        """
+        with self._passphrase_lock:
+            fd = self._passphrase_fd
+            if fd is None:
+                return None
+            return os.open(f"/proc/self/fd/{fd}", os.O_RDONLY)
 
     def verify_and_set_passphrase(self, passphrase: str) -> bool:
         """
         Verifies the passphrase by attempting a dummy listing.
         Prevents 'Silent Failures' by checking the return code.
         """
-        self.passphrase = passphrase
+        self._store_passphrase(passphrase)
         # We try to list entries to verify the password
         err, _ = self.run_cli("ls", "-q", self.path)
         
         if err:
             # Verification failed -> Wipe immediately
-            self.passphrase = None
+            self._wipe_passphrase()
             return False
         
         # Success -> Start the inactivity timer
@@ -118,35 +274,166 @@ class KeepassxcDatabase:
         if self.is_passphrase_needed():
             raise KeepassxcLockedDbError()
 
+        cached = self._cached_search(query)
+        if cached is not None:
+            return cached
+
         (err, out) = self.run_cli("search", "-q", self.path, query)
         if err:
-            if "No results for that" in err:
+            if _NO_RESULTS_NEEDLE in err:
+                self._store_search(query, [])
                 return []
             raise KeepassxcCliError(err)
-        return [l[1:] for l in out.splitlines()]
+        # Entries are listed one per line as absolute paths ("/group/title")
+        entries = [
+            line[1:] if line.startswith("/") else line
+            for line in out.decode("utf-8").splitlines()
+            if line
+        ]
+        self._store_search(query, entries)
+        return entries
+
+    def _cached_search(self, query: str) -> Optional[List[str]]:
+        """
+        Looks up search results memoized by previous keystrokes.
+        Returns None if the CLI has to be asked.
+        """
+        now = time.monotonic()
+        with self._cache_lock:
+            hit = self._search_cache.get(query)
+            if hit and now - hit[0] < self._search_ttl:
+                self._search_cache.move_to_end(query)
+                self._reset_lock_timer()
+                return list(hit[1])
+
+            # Typing more plain characters can only narrow the search down,
+            # so if a prefix of the query found nothing, neither will the query.
+            # Search operators (-, +, *, quotes, field:...) don't have that
+            # property.
+            if all(term.isalnum() for term in query.split()):
+                for end in range(len(query) - 1, 0, -1):
+                    hit = self._search_cache.get(query[:end])
+                    if hit and not hit[1] and now - hit[0] < self._search_ttl:
+                        self._store_search(query, [])
+                        self._reset_lock_timer()
+                        return []
+        return None
+
+    def _store_search(self, query: str, entries: List[str]) -> None:
+        with self._cache_lock:
+            # Locked while the CLI was running, keep the cache empty
+            if self._passphrase_fd is None:
+                return
+            self._search_cache[query] = (time.monotonic(), entries)
+            self._search_cache.move_to_end(query)
+            while len(self._search_cache) > self._search_maxsize:
+                self._search_cache.popitem(last=False)
 
     def get_entry_details(self, entry: str) -> Dict[str, str]:
         """
         Fetches details including standard fields and TOTP.
+        Standard fields are memoized for a few seconds, so that going from the
+        details view straight to autotype/copy doesn't fork the CLI again.
+        TOTP is never served from the cache since the code keeps changing.
         """
         if self.is_passphrase_needed():
             raise KeepassxcLockedDbError()
 
+        attrs = self._cached_details(entry)
+        if attrs is None:
+            return self._fetch_entry_details(entry)
+        if "TOTP" in attrs:
+            totp = self._fetch_totp(entry)
+            if totp:
+                attrs["TOTP"] = totp
+            else:
+                del attrs["TOTP"]
+        return attrs
+
+    def get_entry_attribute(self, entry: str, attr: str) -> str:
+        """
+        Fetches a single attribute ('Password', 'UserName', 'URL', 'Notes', 'TOTP').
+        Served from memory if the entry details were fetched a moment ago,
+        which is the usual case when coming from the details view.
+        """
+        if self.is_passphrase_needed():
+            raise KeepassxcLockedDbError()
+
+        attrs = self._cached_details(entry)
+        if attrs is None:
+            return self._fetch_entry_details(entry).get(attr, "")
+        if attr == "TOTP":
+            return self._fetch_totp(entry) if "TOTP" in attrs else ""
+        return attrs.get(attr, "")
+
+    def _cached_details(self, entry: str) -> Optional[Dict[str, str]]:
+        """
+        Returns a copy of the memoized details, or None if missing or expired.
+        A "TOTP" key only tells that the entry has TOTP, the code itself is stale.
+        """
+        with self._cache_lock:
+            cached = self._details_cache.get(entry)
+            if cached is None:
+                return None
+            if time.monotonic() - cached[0] >= self._details_ttl:
+                # Don't keep plaintext around any longer than needed
+                del self._details_cache[entry]
+                return None
+            self._details_cache.move_to_end(entry)
+        self._reset_lock_timer()
+        return dict(cached[1])
+
+    def _fetch_entry_details(self, entry: str) -> Dict[str, str]:
+        # Fetch standard attributes in one go, `show` prints one value per line
+        # in the requested order. Notes go last since they may span several lines.
+        show_args = [arg for attr in ENTRY_ATTRIBUTES for arg in ("-a", attr)]
+        (err, out) = self.run_cli("show", "-q", *show_args, self.path, f"/{entry}")
+        if err:
+            raise KeepassxcCliError(err)
+        values = out.decode("utf-8").split("\n", len(ENTRY_ATTRIBUTES) - 1)
+        values += [""] * (len(ENTRY_ATTRIBUTES) - len(values))
         attrs = dict()
-        # Fetch standard attributes
-        for attr in ["UserName", "Password", "URL", "Notes"]:
-            (err, out) = self.run_cli("show", "-q", "-a", attr, self.path, f"/{entry}")
-            if err:
-                raise KeepassxcCliError(err)
-            attrs[attr] = out.strip("\n")
-        
-        # Try to fetch TOTP (requires -t flag)
-        # We ignore errors here because not every entry has TOTP
+        for attr, val in zip(ENTRY_ATTRIBUTES, values):
+            attrs[attr] = val.strip("\n")
+
+        # Most entries have no TOTP, only ask once per entry
+        has_totp = self._has_totp.get(entry, True)
+        if has_totp:
+            totp = self._fetch_totp(entry)
+            has_totp = bool(totp)
+            if totp:
+                attrs["TOTP"] = totp
+
+        with self._cache_lock:
+            # Locked while the CLI was running, don't bring plaintext back
+            if self._passphrase_fd is None:
+                return dict(attrs)
+            self._has_totp[entry] = has_totp
+            now = time.monotonic()
+            # Lookups reorder the entries, so expired ones may sit anywhere
+            expired = [
+                key
+                for key, (fetched_at, _) in self._details_cache.items()
+                if now - fetched_at >= self._details_ttl
+            ]
+            for key in expired:
+                del self._details_cache[key]
+            self._details_cache[entry] = (now, attrs)
+            self._details_cache.move_to_end(entry)
+            while len(self._details_cache) > self._details_maxsize:
+                self._details_cache.popitem(last=False)
+
+        return dict(attrs)
+
+    def _fetch_totp(self, entry: str) -> str:
+        """
+        Fetches the current TOTP code (requires -t flag).
+        We ignore errors here because not every entry has TOTP.
+        """
         (err, out) = self.run_cli("show", "-q", "-t", self.path, f"/{entry}")
         if not err and out:
-            attrs["TOTP"] = out.strip("\n")
-        
-        return attrs
+            return out.strip(b"\n").decode("utf-8")
+        return ""
 
     def copy_to_clipboard(self, entry: str, attr: str = "password", timeout: int = 10) -> None:
         """
@@ -168,48 +455,81 @@ class KeepassxcDatabase:
             cmd.extend(["-a", attr])
 
         # Fire & Forget: We don't wait for this process.
-        # It runs in the background to handle the clipboard clearing.
-        subprocess.Popen(
-            cmd,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.DEVNULL, # Suppress output
-            stderr=subprocess.DEVNULL, # Suppress errors (or log them if needed)
-        ).communicate(input=bytes(self.passphrase, "utf-8"))
+        # It runs in the background to handle the clipboard clearing,
+        # in its own session so it isn't killed along with Ulauncher.
+        try:
+            stdin = self._open_passphrase()
+        except OSError as exc:
+            raise KeepassxcCliError(f"Unable to read the passphrase: {exc}")
+        if stdin is None:
+            return  # Locked in the meantime
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                stdin=stdin,
+                stdout=subprocess.DEVNULL, # Suppress output
+                stderr=subprocess.DEVNULL, # Suppress errors (or log them if needed)
+                start_new_session=True,
+            )
+        finally:
+            os.close(stdin)
+
+        # Reap the ones that are done by now
+        self._clip_procs = [p for p in self._clip_procs if p.poll() is None]
+        self._clip_procs.append(proc)
 
     def can_execute_cli(self) -> bool:
+        # Look it up in $PATH first, no need to fork if it isn't there
+        if shutil.which(self.cli) is None:
+            return False
+        # Make sure it actually runs (e.g. no missing libraries)
         try:
-            subprocess.run(
-                [self.cli], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False
+            proc = subprocess.run(
+                [self.cli, "--version"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                check=False,
+                timeout=5,
             )
-            return True
-        except OSError:
+        except (OSError, subprocess.TimeoutExpired):
             return False
+        return proc.returncode == 0
 
-    def run_cli(self, *args) -> Tuple[str, str]:
+    def run_cli(self, *args) -> Tuple[bytes, bytes]:
         """
         Executes the CLI tool.
-        Pipes the passphrase via STDIN to avoid process list leakage.
+        Passes the passphrase via STDIN to avoid process list leakage.
+        Output is returned undecoded, callers decode only what they use.
         """
+        try:
+            stdin = self._open_passphrase()
+        except OSError as exc:
+            raise KeepassxcCliError(f"Unable to read the passphrase: {exc}")
         try:
             proc = subprocess.run(
                 [self.cli, *args],
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                input=bytes(self.passphrase, "utf-8") if self.passphrase else None,
+                # Without a passphrase (e.g. locked meanwhile) the CLI fails
+                # with an error instead of waiting on our own stdin
+                stdin=subprocess.DEVNULL if stdin is None else stdin,
                 check=False,
             )
         except OSError:
             raise KeepassxcCliNotFoundError()
+        finally:
+            if stdin is not None:
+                os.close(stdin)
 
-        stderr = proc.stderr.decode("utf-8")
-        stdout = proc.stdout.decode("utf-8")
+        stderr = proc.stderr
+        stdout = proc.stdout
 
         # Fix for Silent Failures: Check exit code!
         if proc.returncode != 0 and not stderr:
-            stderr = f"Process failed with exit code {proc.returncode}"
+            stderr = f"Process failed with exit code {proc.returncode}".encode()
 
         # Reset timer on activity
-        if self.passphrase:
+        if self._passphrase_fd is not None:
              try:
                 self._reset_lock_timer()
              except AttributeError:
@@ -1,7 +1,9 @@
 """
 Functions that deal with rendering Ulauncher result items.
 """
-from typing import List, Dict
+from functools import lru_cache
+from itertools import islice
+from typing import List, Dict, FrozenSet
 from ulauncher.api.shared.item.ResultItem import ResultItem
 from ulauncher.api.shared.item.ExtensionResultItem import ExtensionResultItem
 from ulauncher.api.shared.item.ExtensionSmallResultItem import ExtensionSmallResultItem
@@ -10,48 +12,75 @@ from ulauncher.api.shared.action.RenderResultListAction import RenderResultListA
 from ulauncher.api.shared.action.DoNothingAction import DoNothingAction
 from ulauncher.api.shared.action.ExtensionCustomAction import ExtensionCustomAction
 
+_ICON_KEY = "images/key.svg"
+_ICON_COPY = "images/copy.svg"
+
+# Entry fields active_entry() can offer actions for
+ENTRY_FIELDS = frozenset(("Password", "UserName", "URL", "Notes", "TOTP"))
+
+# DoNothingAction carries no state, one instance serves every inert item
+_DO_NOTHING = DoNothingAction()
+
 NO_SEARCH_RESULTS_ITEM = ExtensionResultItem(
     icon="images/not_found.svg",
     name="No matching entries found...",
     description="Please check spelling or make the query less specific",
-    on_enter=DoNothingAction(),
+    on_enter=_DO_NOTHING,
 )
+_NO_SEARCH_RESULTS_ACTION = RenderResultListAction([NO_SEARCH_RESULTS_ITEM])
+
 
+def _fmt_totp(code: str) -> str:
+    """ Splits a TOTP code in two halves for readability, e.g. "123 456" """
+    if code.isdigit() and len(code) in (6, 7, 8):
+        half = len(code) // 2
+        return code[:half] + " " + code[half:]
+    return code
 
+
+# Only serialized by Ulauncher, so the same item can be handed out repeatedly
+@lru_cache(maxsize=128)
 def item_more_results_available(cnt: int) -> ResultItem:
     return ExtensionSmallResultItem(
         icon="images/empty.png",
         name="...{} more results available, please refine the search query...".format(
             cnt
         ),
-        on_enter=DoNothingAction(),
+        on_enter=_DO_NOTHING,
     )
 
 
+# Constant results are built once and shared, Ulauncher only serializes them
+_CLI_NOT_FOUND_ACTION = RenderResultListAction(
+    [
+        ExtensionResultItem(
+            icon="images/error.svg",
+            name="Cannot execute keepassxc-cli",
+            description="Please make sure keepassxc-cli is installed and accessible",
+            on_enter=_DO_NOTHING,
+        )
+    ]
+)
+
+
 def cli_not_found_error() -> BaseAction:
-    return RenderResultListAction(
-        [
-            ExtensionResultItem(
-                icon="images/error.svg",
-                name="Cannot execute keepassxc-cli",
-                description="Please make sure keepassxc-cli is installed and accessible",
-                on_enter=DoNothingAction(),
-            )
-        ]
-    )
+    return _CLI_NOT_FOUND_ACTION
+
+
+_DB_FILE_NOT_FOUND_ACTION = RenderResultListAction(
+    [
+        ExtensionResultItem(
+            icon="images/error.svg",
+            name="Cannot find the database file",
+            description="Please verify database file path in extension preferences",
+            on_enter=_DO_NOTHING,
+        )
+    ]
+)
 
 
 def db_file_not_found_error() -> BaseAction:
-    return RenderResultListAction(
-        [
-            ExtensionResultItem(
-                icon="images/error.svg",
-                name="Cannot find the database file",
-                description="Please verify database file path in extension preferences",
-                on_enter=DoNothingAction(),
-            )
-        ]
-    )
+    return _DB_FILE_NOT_FOUND_ACTION
 
 
 def keepassxc_cli_error(message: str) -> BaseAction:
@@ -61,7 +90,7 @@ def keepassxc_cli_error(message: str) -> BaseAction:
                 icon="images/error.svg",
                 name="Error while calling keepassxc CLI",
                 description=message,
-                on_enter=DoNothingAction(),
+                on_enter=_DO_NOTHING,
             )
         ]
     )
@@ -80,155 +109,167 @@ def ask_to_enter_passphrase(db_path: str) -> BaseAction:
     )
 
 
+_ASK_TO_ENTER_QUERY_ACTION = RenderResultListAction(
+    [
+        ExtensionResultItem(
+            icon="images/keepassxc-search.svg",
+            name="Enter search query...",
+            description="Please enter your search query",
+            on_enter=_DO_NOTHING,
+        )
+    ]
+)
+
+
 def ask_to_enter_query() -> BaseAction:
-    return RenderResultListAction(
-        [
-            ExtensionResultItem(
-                icon="images/keepassxc-search.svg",
-                name="Enter search query...",
-                description="Please enter your search query",
-                on_enter=DoNothingAction(),
-            )
-        ]
-    )
+    return _ASK_TO_ENTER_QUERY_ACTION
 
 
 def search_results(
     keyword: str, arg: str, entries: List[str], max_items: int
 ) -> BaseAction:
     """ Builds the list of search results """
-    items = []
     if not entries:
-        items.append(NO_SEARCH_RESULTS_ITEM)
-    else:
-        for entry in entries[:max_items]:
-            action = ExtensionCustomAction(
-                {
-                    "action": "activate_entry",
-                    "entry": entry,
-                    "keyword": keyword,
-                    "prev_query_arg": arg,
-                },
-                keep_app_open=True,
-            )
-            items.append(
-                ExtensionSmallResultItem(
-                    icon="images/key.svg", name=entry, on_enter=action
-                )
-            )
-        if len(entries) > max_items:
-            items.append(item_more_results_available(len(entries) - max_items))
+        return _NO_SEARCH_RESULTS_ACTION
+
+    # Only the entry differs between the items
+    base_payload = {
+        "action": "activate_entry",
+        "keyword": keyword,
+        "prev_query_arg": arg,
+    }
+    items = [
+        ExtensionSmallResultItem(
+            icon=_ICON_KEY,
+            name=entry,
+            on_enter=ExtensionCustomAction(
+                dict(base_payload, entry=entry), keep_app_open=True
+            ),
+        )
+        for entry in islice(entries, max_items)
+    ]
+    if len(entries) > max_items:
+        items.append(item_more_results_available(len(entries) - max_items))
     return RenderResultListAction(items)
 
 
-def active_entry(entry_name: str, details: Dict[str, str]) -> BaseAction:
+def _type_action(entry_name: str, field: str) -> BaseAction:
+    """ Types an entry field into the focused window (type_field in extension.py) """
+    return ExtensionCustomAction(
+        {"action": "type_field", "entry": entry_name, "field": field},
+        keep_app_open=False,
+    )
+
+
+def _copy_action(entry_name: str, attr: str) -> BaseAction:
+    """ Copies an entry attribute to the clipboard (secure_copy in extension.py) """
+    return ExtensionCustomAction(
+        {"action": "secure_copy", "entry": entry_name, "attr": attr},
+        keep_app_open=False,
+    )
+
+
+def active_entry(
+    entry_name: str,
+    details: Dict[str, str],
+    enabled_fields: FrozenSet[str] = ENTRY_FIELDS,
+) -> BaseAction:
     """
     Renders detailed actions for a specific entry.
     Priority: 
     1. Autotype Helpers (Type Password, Type TOTP...)
     2. Secure Copy Actions
+    Fields missing from enabled_fields get no actions at all.
     """
-    items = []
-
-    # --- SECTION 1: AUTOTYPE HELPERS (Use xdotool) ---
-    
-    # Type Password
-    if details.get("Password"):
-        items.append(ExtensionSmallResultItem(
-            icon="images/key.svg",
-            name="Type Password",
-            on_enter=ExtensionCustomAction({
-                "action": "type_field",
-                "entry": entry_name,
-                "field": "Password"
-            }, keep_app_open=False)
-        ))
-
-    # Type TOTP (Shows the code directly in the name for convenience)
-    if details.get("TOTP"):
-        items.append(ExtensionSmallResultItem(
-            icon="images/key.svg",
-            name=f"Type TOTP: {details['TOTP']}",
-            description="Types the current 2FA code",
-            on_enter=ExtensionCustomAction({
-                "action": "type_field",
-                "entry": entry_name,
-                "field": "TOTP"
-            }, keep_app_open=False)
-        ))
-
-    # Type Username
-    if details.get("UserName"):
-        items.append(ExtensionSmallResultItem(
-            icon="images/key.svg",
-            name=f"Type Username: {details['UserName']}",
-            on_enter=ExtensionCustomAction({
-                "action": "type_field",
-                "entry": entry_name,
-                "field": "UserName"
-            }, keep_app_open=False)
-        ))
-
-    # Type URL
-    if details.get("URL"):
-        items.append(ExtensionSmallResultItem(
-            icon="images/key.svg",
-            name=f"Type URL: {details['URL']}",
-            on_enter=ExtensionCustomAction({
-                "action": "type_field",
-                "entry": entry_name,
-                "field": "URL"
-            }, keep_app_open=False)
-        ))
-        
-    # --- SECTION 2: COPY ACTIONS (Secure Copy) ---
-    
-    # Copy TOTP
-    if details.get("TOTP"):
-        items.append(ExtensionResultItem(
-            icon="images/copy.svg",
-            name="Copy TOTP to clipboard",
-            description="Generates fresh code and clears clipboard after timeout",
-            on_enter=ExtensionCustomAction({
-                "action": "secure_copy",
-                "entry": entry_name,
-                "attr": "totp"
-            }, keep_app_open=False)
-        ))
-
-    attrs = [
-        ("Password", "password"),
-        ("UserName", "username"),
-        ("URL", "URL"),
-        ("Notes", "notes"),
-    ]
-    
-    for attr, attr_nice in attrs:
-        val = details.get(attr, "")
-        if val:
-            # We use ExtensionCustomAction to route to 'secure_copy' in extension.py
-            action = ExtensionCustomAction({
-                "action": "secure_copy",
-                "entry": entry_name,
-                "attr": attr
-            }, keep_app_open=False)
-
-            if attr == "Password":
-                items.append(
-                    ExtensionSmallResultItem(
-                        icon="images/copy.svg",
-                        name="Copy password to clipboard",
-                        on_enter=action,
-                    )
-                )
-            else:
-                items.append(
-                    ExtensionResultItem(
-                        icon="images/copy.svg",
-                        name="{}: {}".format(attr_nice.capitalize(), val),
-                        description="Copy {} to clipboard (Secure)".format(attr_nice),
-                        on_enter=action,
-                    )
-                )
-
-    return RenderResultListAction(items)
\ No newline at end of file
+    pw = details.get("Password") if "Password" in enabled_fields else None
+    totp = details.get("TOTP") if "TOTP" in enabled_fields else None
+    user = details.get("UserName") if "UserName" in enabled_fields else None
+    url = details.get("URL") if "URL" in enabled_fields else None
+    notes = details.get("Notes") if "Notes" in enabled_fields else None
+
+    # One row per item, skipped when the entry has no value for it:
+    # (value, item class, icon, name, description, action factory, field)
+    Small, Large = ExtensionSmallResultItem, ExtensionResultItem
+    spec = (
+        # --- SECTION 1: AUTOTYPE HELPERS (Use xdotool) ---
+        (pw, Small, _ICON_KEY, "Type Password", "", _type_action, "Password"),
+        # Shows the TOTP code directly in the name for convenience
+        (
+            totp,
+            Small,
+            _ICON_KEY,
+            f"Type TOTP: {_fmt_totp(totp)}" if totp else "",
+            "Types the current 2FA code",
+            _type_action,
+            "TOTP",
+        ),
+        (
+            user,
+            Small,
+            _ICON_KEY,
+            f"Type Username: {user}",
+            "",
+            _type_action,
+            "UserName",
+        ),
+        (url, Small, _ICON_KEY, f"Type URL: {url}", "", _type_action, "URL"),
+        # --- SECTION 2: COPY ACTIONS (Secure Copy) ---
+        (
+            totp,
+            Large,
+            _ICON_COPY,
+            "Copy TOTP to clipboard",
+            "Generates fresh code and clears clipboard after timeout",
+            _copy_action,
+            "totp",
+        ),
+        (
+            pw,
+            Small,
+            _ICON_COPY,
+            "Copy password to clipboard",
+            "",
+            _copy_action,
+            "Password",
+        ),
+        (
+            user,
+            Large,
+            _ICON_COPY,
+            f"Username: {user}",
+            "Copy username to clipboard (Secure)",
+            _copy_action,
+            "UserName",
+        ),
+        (
+            url,
+            Large,
+            _ICON_COPY,
+            f"URL: {url}",
+            "Copy URL to clipboard (Secure)",
+            _copy_action,
+            "URL",
+        ),
+        (
+            notes,
+            Large,
+            _ICON_COPY,
+            f"Notes: {notes}",
+            "Copy notes to clipboard (Secure)",
+            _copy_action,
+            "Notes",
+        ),
+    )
+
+    return RenderResultListAction(
+        [
+            cls(
+                icon=icon,
+                name=name,
+                description=description,
+                on_enter=make_action(entry_name, field),
+            )
+            for val, cls, icon, name, description, make_action, field in spec
+            if val
+        ]
+    )
@@ -11,18 +11,33 @@ class WmctrlNotFoundError(Exception):
     """
 
 
+class WmctrlWindowNotFoundError(Exception):
+    """
+    wmctrl could not find the requested window
+    """
+
+
 def activate_window_by_id(window_id) -> None:
     """
     Execute wmctrl command "activate window by id"
     """
-    _run_wmctrl("-i", "-a", window_id)
+    _activate_window("-i", "-a", window_id)
 
 
 def activate_window_by_class_name(class_name) -> None:
     """
     Execute wmctrl command "activate window by class name"
     """
-    _run_wmctrl("-x", "-F", "-a", class_name)
+    _activate_window("-x", "-F", "-a", class_name)
+
+
+def _activate_window(*args) -> None:
+    """
+    Execute a wmctrl activation command, wmctrl exits with 1 if no window matched
+    """
+    returncode, _ = _run_wmctrl(*args)
+    if returncode != 0:
+        raise WmctrlWindowNotFoundError()
 
 
 # adapted from https://github.com/autokey/autokey/blob/master/lib/autokey/scripting.py
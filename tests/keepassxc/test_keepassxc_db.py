@@ -1,3 +1,6 @@
+import os
+import shutil
+from threading import Thread
 from time import sleep
 import pytest
 from keepassxc import keepassxc_db as kpdb
@@ -26,6 +29,12 @@ def test_db_not_found():
         db.initialize("test/data/no_such_file", 0)
 
 
+def test_db_path_is_directory():
+    db = kpdb.KeepassxcDatabase()
+    with pytest.raises(kpdb.KeepassxcFileNotFoundError):
+        db.initialize("tests/data", 0)
+
+
 def test_inactivity_lock():
     TIMEOUT = 1
     test_db = kpdb.KeepassxcDatabase()
@@ -38,6 +47,20 @@ def test_inactivity_lock():
     assert test_db.is_passphrase_needed()
 
 
+def test_inactivity_lock_postponed_by_activity():
+    TIMEOUT = 1
+    test_db = kpdb.KeepassxcDatabase()
+    test_db.initialize("tests/data/test.kdbx", TIMEOUT)
+    assert test_db.verify_and_set_passphrase("right passphrase")
+    sleep(TIMEOUT * 0.6)
+    test_db.search("onlinesite")
+    # still unlocked: the search counts as activity
+    sleep(TIMEOUT * 0.6)
+    assert not test_db.is_passphrase_needed()
+    sleep(TIMEOUT * 0.5)
+    assert test_db.is_passphrase_needed()
+
+
 def test_search_locked_db(test_db):
     with pytest.raises(kpdb.KeepassxcLockedDbError):
         test_db.search("none of this, you see")
@@ -81,3 +104,89 @@ def test_lock_unlock_after_path_change(test_db):
     # unlock 2
     test_db.verify_and_set_passphrase("right passphrase2")
     assert not test_db.is_passphrase_needed()
+
+
+def test_get_entry_details_cache_wiped_on_lock(test_db):
+    test_db.verify_and_set_passphrase("right passphrase")
+    details = test_db.get_entry_details("onlinesite personal")
+    # second lookup is served from memory
+    assert test_db.get_entry_details("onlinesite personal") == details
+    # locking the database must not leave plaintext details behind
+    test_db.change_path("tests/data/test2.kdbx")
+    assert not test_db._details_cache
+
+
+def test_get_entry_details_cache_expires(test_db):
+    test_db.verify_and_set_passphrase("right passphrase")
+    test_db._details_ttl = 0
+    test_db.get_entry_details("onlinesite personal")
+    # expired details are dropped, not just ignored
+    assert test_db._cached_details("onlinesite personal") is None
+    assert not test_db._details_cache
+
+
+def test_wipe_while_storing_passphrase():
+    db = kpdb.KeepassxcDatabase()
+
+    def wipe():
+        for _ in range(500):
+            db._wipe_passphrase()
+
+    # the lock timer wipes from its own thread, that must never hit a
+    # half-written or already closed buffer
+    wiper = Thread(target=wipe)
+    wiper.start()
+    for _ in range(500):
+        db._store_passphrase("right passphrase")
+        stdin = db._open_passphrase()
+        if stdin is not None:
+            os.close(stdin)
+    wiper.join()
+    db._wipe_passphrase()
+    assert db.is_passphrase_needed()
+
+
+def test_search_narrowing_empty_query(test_db):
+    test_db.verify_and_set_passphrase("right passphrase")
+    assert not test_db.search("nonesuch")
+    # a longer query can't find anything either, no need to ask the CLI
+    assert test_db._cached_search("nonesuchx") == []
+    assert not test_db.search("nonesuchx")
+    # search operators may widen the results, so they are not short-circuited
+    assert test_db._cached_search("nonesuch -x") is None
+
+
+def test_get_entry_attribute(test_db):
+    test_db.verify_and_set_passphrase("right passphrase")
+    assert test_db.get_entry_attribute("onlinesite personal", "UserName") == "username"
+    test_db.get_entry_details("onlinesite personal")
+    assert test_db.get_entry_attribute("onlinesite personal", "Password") == "password"
+    assert test_db.get_entry_attribute("onlinesite personal", "TOTP") == ""
+
+
+def test_caches_dropped_when_db_file_changes(tmp_path):
+    db_file = str(tmp_path / "test.kdbx")
+    shutil.copy("tests/data/test.kdbx", db_file)
+    db = kpdb.KeepassxcDatabase()
+    db.initialize(db_file, 0)
+    db.verify_and_set_passphrase("right passphrase")
+    db.search("onlinesite")
+    db.initialize(db_file, 0)
+    assert db._search_cache
+    # database saved by somebody else
+    os.utime(db_file, ns=(0, 0))
+    db.initialize(db_file, 0)
+    assert not db._search_cache
+
+
+def test_caches_dropped_when_db_file_disappears(tmp_path):
+    db_file = str(tmp_path / "test.kdbx")
+    shutil.copy("tests/data/test.kdbx", db_file)
+    db = kpdb.KeepassxcDatabase()
+    db.initialize(db_file, 0)
+    db.verify_and_set_passphrase("right passphrase")
+    db.search("onlinesite")
+    assert db._search_cache
+    os.remove(db_file)
+    db.initialize(db_file, 0)
+    assert not db._search_cache